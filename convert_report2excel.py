@@ -1,253 +1,291 @@
 import os
 from argparse import ArgumentParser, Namespace
-from typing import Union
+from functools import lru_cache
+from multiprocessing import Pool
+from typing import Iterator, NamedTuple, Optional, Union
 
+import numpy as np
 import pandas as pd
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.formatting.rule import ColorScaleRule
-from openpyxl.styles import Border, Color, Font, PatternFill, Side
+from openpyxl.styles import Border, Color, Font, NamedStyle, PatternFill, Side
 from openpyxl.utils import get_column_letter
-from openpyxl.utils.dataframe import dataframe_to_rows
 from tqdm import tqdm
 
 
-def convert_report2excel(
-    workbook: Workbook,
-    report: Union[pd.DataFrame, dict[str, float]],
-    sheet_name: str = "",
-) -> Workbook:
-    """Function to convert classification report to formatted Excel file.
-
-    An openpyxl.Workbook object must first be created outside of the func and provided.
-    The func will create a formatted sheet, add it to the provided Workbook, and return it.
+# Formatting for header row and column.
+#   Header color is light gray here.
+HEADER_COLOR = PatternFill(start_color="D9D9D9", end_color="D9D9D9", fill_type="solid")
+HEADER_FONT = Font(name="Arial", bold=True)
+DEFAULT_FONT = Font(name="Arial", bold=False)
+
+# For conditional formatting.
+#   Higher = greener.
+COLOR_SCALE_RULE = ColorScaleRule(
+    start_type="num",
+    start_value=0.0,
+    start_color=Color(rgb="E67C73"),  # Red
+    mid_type="num",
+    mid_value=0.6,
+    mid_color=Color(rgb="FFFFFF"),  # White
+    end_type="num",
+    end_value=1.0,
+    end_color=Color(rgb="57BB8A"),  # Green
+)
+
+# Floating point precision.
+FLOAT_PREC = "0.0000"
+
+# Named styles for header cells, metric cells, and count (e.g., support) cells.
+HEADER_STYLE = "report_header"
+DATA_STYLE = "report_data"
+COUNT_STYLE = "report_count"
+
+# Last row of an Excel sheet.
+EXCEL_MAX_ROW = 1048576
+
+
+@lru_cache(maxsize=None)
+def _get_border(
+    left: Optional[str] = None,
+    right: Optional[str] = None,
+    top: Optional[str] = None,
+    bottom: Optional[str] = None,
+) -> Border:
+    """Return the shared Border for the given side styles (e.g., "thin" or "thick").
+
+    Cells with the same sides reuse a single Border instead of each creating their own.
     """
-    # Formatting for header row and column.
-    #   Header color is light gray here.
-    header_color = PatternFill(
-        start_color="D9D9D9", end_color="D9D9D9", fill_type="solid"
-    )
-    header_font = Font(name="Arial", bold=True)
-    default_font = Font(name="Arial", bold=False)
-
-    # For conditional formatting.
-    #   Higher = greener.
-    start_color = Color(rgb="E67C73")  # White
-    mid_color = Color(rgb="FFFFFF")  # Red
-    end_color = Color(rgb="57BB8A")  # Green
-    color_scale_rule = ColorScaleRule(
-        start_type="num",
-        start_value=0.0,
-        start_color=start_color,
-        mid_type="num",
-        mid_value=0.6,
-        mid_color=mid_color,
-        end_type="num",
-        end_value=1.0,
-        end_color=end_color,
+    return Border(
+        left=Side(style=left) if left else None,
+        right=Side(style=right) if right else None,
+        top=Side(style=top) if top else None,
+        bottom=Side(style=bottom) if bottom else None,
     )
 
-    # Floating point precision.
-    float_prec = "0.0000"
 
-    if isinstance(report, dict):
-        report = pd.DataFrame(report).T
-        report.reset_index(inplace=True)
+class _SheetPlan(NamedTuple):
+    """Cell values and style layout of a report sheet, without any openpyxl objects.
 
-    if "index" in report.columns.values:
-        report.rename(columns={"index": "class"}, inplace=True)
-    else:
-        report.rename(columns={"Unnamed: 0": "class"}, inplace=True)
+    Plans can be built in worker processes and written to the Workbook afterwards.
+    """
 
-    df_xl = dataframe_to_rows(df=report, index=False)
+    rows: list[list]
+    top_sides: dict[int, Optional[str]]
+    bottom_sides: dict[int, Optional[str]]
+    left_sides: dict[int, Optional[str]]
+    right_sides: dict[int, Optional[str]]
+    support_col: int
+    grid_range: str
 
-    worksheet = workbook.create_sheet(title=sheet_name)
 
-    for row in df_xl:
-        worksheet.append(row)
-
-    # Outer boundary formatting.
-    outer_border_top_row = 1
-    outer_border_top_col = 1
-    outer_border_bottom_row = report.shape[0] + 1
-    outer_border_bottom_col = report.shape[1]
-
-    top_left_corner = Border(top=Side(style="thin"), left=Side(style="thin"))
-    top_right_corner = Border(top=Side(style="thin"), right=Side(style="thin"))
-    bottom_left_corner = Border(left=Side(style="thin"), bottom=Side(style="thin"))
-    bottom_right_corner = Border(right=Side(style="thin"), bottom=Side(style="thin"))
-    top = Border(top=Side(style="thin"))
-    bottom = Border(bottom=Side(style="thin"))
-    left = Border(left=Side(style="thin"))
-    right = Border(right=Side(style="thin"))
-
-    top_left = f"{get_column_letter(outer_border_top_col)}" f"{outer_border_top_row}"
-    bottom_right = (
-        f"{get_column_letter(outer_border_bottom_col)}" f"{outer_border_bottom_row}"
-    )
-    for row in worksheet[top_left:bottom_right]:
-        for cell in row:
-            if cell.row == 1 and cell.column == 1:
-                worksheet.cell(
-                    row=cell.row, column=cell.column
-                ).border = top_left_corner
-            elif cell.row == 1 and cell.column == report.shape[0]:
-                worksheet.cell(
-                    row=cell.row, column=cell.column
-                ).border = top_right_corner
-            elif cell.row == report.shape[0] + 1 and cell.column == 1:
-                worksheet.cell(
-                    row=cell.row, column=cell.column
-                ).border = bottom_left_corner
-            elif cell.row == report.shape[0] + 1 and cell.column == report.shape[1]:
-                worksheet.cell(
-                    row=cell.row, column=cell.column
-                ).border = bottom_right_corner
-            elif cell.row in range(1, report.shape[0] + 1) and cell.column == 1:
-                worksheet.cell(row=cell.row, column=cell.column).border = left
-            elif (
-                cell.row in range(1, report.shape[0] + 1)
-                and cell.column == report.shape[1]
-            ):
-                worksheet.cell(row=cell.row, column=cell.column).border = right
-            elif cell.row == 1 and cell.column in range(1, report.shape[1] + 1):
-                worksheet.cell(row=cell.row, column=cell.column).border = top
-            elif cell.row == report.shape[0] + 1 and cell.column in range(
-                1, report.shape[1] + 1
-            ):
-                worksheet.cell(row=cell.row, column=cell.column).border = bottom
-            else:
-                continue
-
-    # Header boundary.
-    row = 1
-    start_col = 1
-    end_col = report.shape[1]
-
-    left = f"{get_column_letter(start_col)}{start_col}"
-    right = f"{get_column_letter(end_col)}{end_col}"
-
-    for cell in worksheet[left:right][0]:
-        existing_border = cell.border
-        new_border = Border(
-            left=existing_border.left,
-            right=existing_border.right,
-            top=existing_border.top,
-            bottom=Side(style="thin"),
-        )
-        worksheet.cell(row=cell.row, column=cell.column).border = new_border
-
-    # Support boundary.
-    support_col = report.columns.get_loc("support") + 1
+def _plan_sheet(report: Union[pd.DataFrame, dict[str, float]]) -> _SheetPlan:
+    """Lay out the values and borders of a classification report's sheet."""
+    if isinstance(report, dict):
+        report = pd.DataFrame(report).T.rename_axis("class").reset_index()
 
-    start_row = 1
-    end_row = report.shape[0] + 1
+    rows = [report.columns.tolist()] + report.to_numpy(copy=False).tolist()
 
-    top = f"{get_column_letter(support_col)}{start_row}"
-    bottom = f"{get_column_letter(support_col)}{end_row}"
+    nrows, ncols = report.shape
+    last_row = nrows + 1  # Including the header row.
+    precision_col = report.columns.get_loc("precision") + 1
+    recall_col = report.columns.get_loc("recall") + 1
+    support_col = report.columns.get_loc("support") + 1
+    first_col_values = report.iloc[:, 0].to_numpy()
 
-    for row in worksheet[top:bottom]:
-        for cell in row:
-            existing_border = cell.border
-            new_border = Border(
-                left=Side(style="thin"),
-                right=existing_border.right,
-                top=existing_border.top,
-                bottom=existing_border.bottom,
-            )
-            worksheet.cell(row=cell.row, column=cell.column).border = new_border
-
-    # Label boundary.
-    end_row = report.shape[0] + 1
-
-    for row in worksheet["A1":f"A{end_row}"]:
-        for cell in row:
-            existing_border = cell.border
-            new_border = Border(
-                left=existing_border.left,
-                right=Side(style="thin"),
-                top=existing_border.top,
-                bottom=existing_border.bottom,
-            )
-            worksheet.cell(row=cell.row, column=cell.column).border = new_border
+    # Thick avg divider row.
+    if "accuracy" in first_col_values:
+        avg_label = "accuracy"
+    elif "micro avg" in first_col_values:
+        avg_label = "micro avg"
+    else:
+        avg_label = None
 
-    # Thick avg divider.
-    avg_row = report.shape[0] + 2
+    if avg_label is None:
+        avg_row = nrows + 2
+    else:
+        avg_row = int(np.where(first_col_values == avg_label)[0][0]) + 2
 
-    try:
-        if "accuracy" in report.iloc[:, 0].values:
-            avg_row = report[report.iloc[:, 0] == "accuracy"].index[0] + 2
+    # Fix formatting issue when `accuracy` is outputted.
+    if avg_label == "accuracy":
+        accuracy_values = rows[avg_row - 1]
+        accuracy_values[precision_col - 1] = None
+        accuracy_values[recall_col - 1] = None
+
+        # Use the support of the following row, if the accuracy row isn't the last.
+        if avg_row < len(rows):
+            support_value = rows[avg_row][support_col - 1]
         else:
-            avg_row = report[report.iloc[:, 0] == "micro avg"].index[0] + 2
-
-        start = f"A{avg_row}"
-        end = f"{get_column_letter(report.shape[1])}{avg_row}"
-
-        for row in worksheet[start:end]:
-            for cell in row:
-                existing_border = cell.border
-                new_border = Border(
-                    left=existing_border.left,
-                    right=existing_border.right,
-                    top=Side(style="thick"),
-                    bottom=existing_border.bottom,
-                )
-                worksheet.cell(row=cell.row, column=cell.column).border = new_border
-    except IndexError:
-        pass
+            support_value = None
 
-    # Conditional formatting.
-    gradient_grid_start_row = 1
-    gradient_grid_start_col = report.columns.get_loc("precision") + 1
-    gradient_grid_end_row = avg_row + 2
+        accuracy_values[support_col - 1] = support_value
+
+        if "predicted" in report.columns:
+            accuracy_values[report.columns.get_loc("predicted")] = support_value
+
+    # Border side styles per row and per column. A cell's border is composed of the
+    #   sides of its row (top, bottom) and its column (left, right), covering the
+    #   outer, header, label, support, and avg divider boundaries.
+    top_sides = {i: None for i in range(1, last_row + 1)}
+    top_sides[1] = "thin"
+    top_sides[avg_row] = "thick"
+    bottom_sides = {i: None for i in range(1, last_row + 1)}
+    bottom_sides[1] = "thin"
+    bottom_sides[last_row] = "thin"
+    left_sides = {j: None for j in range(1, ncols + 1)}
+    left_sides[1] = "thin"
+    left_sides[support_col] = "thin"
+    right_sides = {j: None for j in range(1, ncols + 1)}
+    right_sides[1] = "thin"
+    right_sides[ncols] = "thin"
+
+    # Conditional formatting range. Spans the metric columns down to the last row
+    #   Excel supports, so the rule doesn't depend on the report's length.
+    gradient_grid_start_row = 2
+    gradient_grid_start_col = precision_col
+    gradient_grid_end_row = EXCEL_MAX_ROW
     gradient_grid_end_col = support_col - 1
 
     grid_range = (
         f"{get_column_letter(gradient_grid_start_col)}{gradient_grid_start_row}:"
         f"{get_column_letter(gradient_grid_end_col)}{gradient_grid_end_row}"
     )
-    worksheet.conditional_formatting.add(
-        range_string=grid_range, cfRule=color_scale_rule
+
+    return _SheetPlan(
+        rows=rows,
+        top_sides=top_sides,
+        bottom_sides=bottom_sides,
+        left_sides=left_sides,
+        right_sides=right_sides,
+        support_col=support_col,
+        grid_range=grid_range,
     )
 
-    # Format fonts.
-    for row in worksheet[top_left:bottom_right]:
-        for cell in row:
-            if cell.row == 1 or cell.column == 1:
-                worksheet.cell(row=cell.row, column=cell.column).font = header_font
-                worksheet.cell(row=cell.row, column=cell.column).fill = header_color
-            else:
-                worksheet.cell(row=cell.row, column=cell.column).font = default_font
 
-    # Format floating point precision.
-    top_left = "B2"
-    bottom_right = f"{get_column_letter(support_col - 1)}" f"{report.shape[0] + 1}"
+def _add_named_styles(workbook: Workbook) -> None:
+    """Register the report's named styles on the Workbook if they aren't already."""
+    named_styles = [
+        NamedStyle(name=HEADER_STYLE, font=HEADER_FONT, fill=HEADER_COLOR),
+        NamedStyle(name=DATA_STYLE, font=DEFAULT_FONT, number_format=FLOAT_PREC),
+        NamedStyle(name=COUNT_STYLE, font=DEFAULT_FONT),
+    ]
 
-    for row in worksheet[top_left:bottom_right]:
-        for cell in row:
-            worksheet.cell(row=cell.row, column=cell.column).number_format = float_prec
+    for named_style in named_styles:
+        if named_style.name not in workbook.named_styles:
+            workbook.add_named_style(named_style)
 
-    # Fix formatting issue when `accuracy` is outputted.
-    if "accuracy" in report["class"].values:
-        precision_col = report.columns.get_loc("precision") + 1
-        worksheet.cell(
-            row=avg_row,
-            column=precision_col,
-        ).value = ""
 
-        recall_col = report.columns.get_loc("recall") + 1
-        worksheet.cell(row=avg_row, column=recall_col).value = ""
+def _write_sheet(workbook: Workbook, plan: _SheetPlan, sheet_name: str) -> Workbook:
+    """Add a formatted sheet following `plan` to the Workbook and return it."""
+    _add_named_styles(workbook)
 
-        support_value = worksheet.cell(row=avg_row + 1, column=support_col).value
+    # Cells are styled before being appended so that the sheet is written in a single
+    #   pass, which also makes write-only Workbooks usable.
+    worksheet = workbook.create_sheet(title=sheet_name)
 
-        worksheet.cell(row=avg_row, column=support_col).value = support_value
+    left_sides = plan.left_sides
+    right_sides = plan.right_sides
 
-        if "predicted" in report.columns:
-            worksheet.cell(row=avg_row, column=support_col + 1).value = support_value
+    # Named style of each column below the header row.
+    column_styles = {j: COUNT_STYLE for j in left_sides}
+    column_styles.update({j: DATA_STYLE for j in range(2, plan.support_col)})
+    column_styles[1] = HEADER_STYLE
+
+    for i, values in enumerate(plan.rows, start=1):
+        top_side = plan.top_sides[i]
+        bottom_side = plan.bottom_sides[i]
+
+        row_cells = []
+        for j, value in enumerate(values, start=1):
+            cell = WriteOnlyCell(worksheet, value=value)
+
+            # Named styles set the font, fill, and number format in one go, so they
+            #   have to come before the border.
+            cell.style = HEADER_STYLE if i == 1 else column_styles[j]
+
+            cell.border = _get_border(
+                left=left_sides[j],
+                right=right_sides[j],
+                top=top_side,
+                bottom=bottom_side,
+            )
+
+            row_cells.append(cell)
+
+        worksheet.append(row_cells)
+
+    # Conditional formatting.
+    worksheet.conditional_formatting.add(
+        range_string=plan.grid_range, cfRule=COLOR_SCALE_RULE
+    )
 
     return workbook
 
 
+def convert_report2excel(
+    workbook: Workbook,
+    report: Union[pd.DataFrame, dict[str, float]],
+    sheet_name: str = "",
+) -> Workbook:
+    """Function to convert classification report to formatted Excel file.
+
+    An openpyxl.Workbook object must first be created outside of the func and provided.
+    The func will create a formatted sheet, add it to the provided Workbook, and return it.
+    Cells are styled before being added to the sheet, so write-only Workbooks also work.
+    DataFrame reports are expected to have the class labels as their first column.
+    """
+    return _write_sheet(workbook, _plan_sheet(report), sheet_name)
+
+
+def _build_sheet_payload(report_filepath: str) -> tuple[str, _SheetPlan]:
+    """Read a report file and plan its sheet. Runs in worker processes."""
+    # Metric columns are always numeric, so skip dtype inference for them.
+    #   `support` stays float since it can be blank or hold the accuracy.
+    report = pd.read_csv(
+        report_filepath,
+        engine="c",
+        index_col=0,
+        dtype={
+            "precision": "float64",
+            "recall": "float64",
+            "f1-score": "float64",
+            "support": "float64",
+        },
+    )
+    report = report.rename_axis("class").reset_index()
+    sheet_name = os.path.splitext(os.path.basename(report_filepath))[0]
+
+    return sheet_name, _plan_sheet(report)
+
+
+def _iter_sheet_payloads(
+    report_filepaths: list[str], num_workers: int
+) -> Iterator[tuple[str, _SheetPlan]]:
+    """Yield sheet payloads in the order of `report_filepaths`."""
+    if num_workers <= 1:
+        yield from map(_build_sheet_payload, report_filepaths)
+        return
+
+    with Pool(processes=num_workers) as pool:
+        yield from pool.imap(_build_sheet_payload, report_filepaths)
+
+
 def main(args: Namespace) -> None:
+    # Check the save location before doing any work.
+    save_dir = args.save_dir or os.curdir
+
+    if not os.path.isdir(save_dir) or not os.access(save_dir, os.W_OK):
+        raise SystemExit(f"Cannot save to {save_dir}: not a writable directory.")
+
+    if args.report_filename:
+        report_name = os.path.splitext(os.path.basename(args.report_filename))[0]
+        save_filename = f"{report_name}_excel.xlsx"
+    else:
+        save_filename = "reports_formatted.xlsx"
+
+    save_filepath = os.path.join(save_dir, save_filename)
+
     if args.report_filename:
         report_filepaths = [args.report_filename]
     else:
@@ -260,28 +298,24 @@ def main(args: Namespace) -> None:
     for fp in report_filepaths:
         print(f"\t{fp}")
 
-    workbook = Workbook()
-    workbook.remove(workbook.active)  # Remove default sheet.
+    # Write-only Workbooks stream rows to disk instead of keeping every cell in memory.
+    workbook = Workbook(write_only=True)
+
+    # Reading and planning each report is independent, so it can be spread over
+    #   worker processes. Only this process touches the Workbook.
+    num_workers = min(getattr(args, "num_workers", 1), len(report_filepaths))
+    payloads = _iter_sheet_payloads(report_filepaths, num_workers)
 
     pbar = tqdm(
-        iterable=report_filepaths,
+        iterable=payloads,
         desc="Converting classification reports to formatted Excel files",
         total=len(report_filepaths),
     )
-    for file in pbar:
-        report = pd.read_csv(file)
-        sheet_name = os.path.splitext(file.split("/")[-1])[0]
-        workbook = convert_report2excel(workbook, report, sheet_name)
+    for sheet_name, plan in pbar:
+        workbook = _write_sheet(workbook, plan, sheet_name)
 
     print(f"New Workbook has a total of {len(workbook.worksheets)} Worksheets.")
 
-    if args.report_filename:
-        save_filename = f"{os.path.splitext(args.report_filename)[0]}_excel.xlsx"
-    else:
-        save_filename = "reports_formatted.xlsx"
-
-    save_filepath = os.path.join(args.save_dir, save_filename)
-
     print(f"Saving in {save_filepath}")
     workbook.save(save_filepath)
 
@@ -301,6 +335,12 @@ if __name__ == "__main__":
     parser.add_argument(
         "--save_dir", default="", type=str, help="Directory to save Excel files."
     )
+    parser.add_argument(
+        "--num_workers",
+        default=1,
+        type=int,
+        help="Number of processes used to read the report files.",
+    )
 
     args = parser.parse_args()
 